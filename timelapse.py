@@ -40,69 +40,101 @@ TODO: Home Assistant Integration
 	* Latest status message (like "waiting for capture start time" or "capturing…" or "waiting for next capture")
 """
 
+import functools
 import os
+import queue
+import signal
+import socket
+import subprocess
+import threading
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
+from zoneinfo import ZoneInfo
 import logging
+import logging.handlers
 import json
-from picamera2 import Picamera2 # type: ignore
-from picamera2.encoders import H264Encoder # type: ignore
-from picamera2.outputs import FfmpegOutput # type: ignore
-from astral import LocationInfo # type: ignore
-from astral.sun import sun # type: ignore
 import argparse
-import paho.mqtt.client as mqtt
-from PIL import Image
-import io
-import base64
+# picamera2, PIL, simplejpeg, astral and paho are imported where they're first needed,
+# so --help and argument errors don't pay for loading libcamera and numpy
+
+# orjson is optional but much faster; it returns bytes, which paho accepts as-is
+try:
+	import orjson # type: ignore
+	json_dumps = orjson.dumps
+	json_loads = orjson.loads
+except ImportError:
+	json_dumps = json.dumps
+	json_loads = json.loads
 
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
 def load_config():
-	"""Load configuration from JSON file"""
+	"""Load configuration from JSON file
+
+	The file is only read once; later calls return the same dict.
+	"""
 	config_path = Path(__file__).parent / "config.json"
 	template_path = Path(__file__).parent / "config.template.json"
 
 	if not config_path.exists():
 		if template_path.exists():
 			logger.info("No config.json found. Creating from template.")
-			with open(template_path, 'r') as f:
-				config = json.load(f)
-			with open(config_path, 'w') as f:
-				json.dump(config, f, indent=4)
+			template = template_path.read_bytes()
+			config = json_loads(template)
+			config_path.write_bytes(template)
 		else:
 			raise FileNotFoundError("Neither config.json nor config.template.json found!")
 	else:
-		with open(config_path, 'r') as f:
-			config = json.load(f)
+		config = json_loads(config_path.read_bytes())
 
 	return config
 
-# Configure logging
-config = load_config()  # Load config first to get log file path
-log_file = Path(config['paths']['base_dir']) / config['paths']['log_file']
-log_file.parent.mkdir(parents=True, exist_ok=True)
-
-logging.basicConfig(
-	level=logging.INFO,
-	format='%(asctime)s - %(levelname)s - %(message)s',
-	handlers=[
-		logging.FileHandler(str(log_file)),
+def setup_logging(config):
+	"""Configure logging to the log file and console, returns the started listener
+
+	Records are formatted by the QueueHandler and written out by the listener's
+	background thread, so logging never blocks the capture loop on disk I/O.
+	"""
+	log_file = Path(config['paths']['base_dir']) / config['paths']['log_file']
+	log_file.parent.mkdir(parents=True, exist_ok=True)
+
+	log_queue = queue.Queue(-1)
+	logging.basicConfig(
+		level=config.get('logging', {}).get('level', 'INFO'),
+		format='%(asctime)s - %(levelname)s - %(message)s',
+		handlers=[logging.handlers.QueueHandler(log_queue)]
+	)
+	log_listener = logging.handlers.QueueListener(
+		log_queue,
+		# Rotate so the log can't fill the SD card; delay opening until the first record.
+		# Records are written in batches of 200 to spare the SD card, errors flush straight away.
+		logging.handlers.MemoryHandler(
+			capacity=200,
+			flushLevel=logging.ERROR,
+			target=logging.handlers.RotatingFileHandler(
+				str(log_file), maxBytes=1024 * 1024, backupCount=3, encoding='utf-8', delay=True
+			)
+		),
 		logging.StreamHandler()
-	]
-)
-logger = logging.getLogger(__name__)
+	)
+	log_listener.start()
+	return log_listener
 
 class HomeAssistantMQTT:
 	"""Handles MQTT communication with Home Assistant"""
-	def __init__(self, host="localhost", port=1883, username=None, password=None):
+	def __init__(self, host="localhost", port=1883, username=None, password=None, debug=False):
 		logger.info(f"Initializing MQTT connection to {host}:{port}")
 		try:
-			# Enable MQTT internal logging
+			import paho.mqtt.client as mqtt
+
+			# paho logs several DEBUG lines per publish, so only keep its warnings unless debugging
 			mqtt.Client.bad_connection_flag = False
 			mqtt_logger = logging.getLogger('mqtt')
-			mqtt_logger.setLevel(logging.DEBUG)
+			mqtt_logger.setLevel(logging.DEBUG if debug else logging.WARNING)
 
-			self.client = mqtt.Client()
+			self.client = mqtt.Client(clean_session=True, transport="tcp")
 			self.client.enable_logger(mqtt_logger)
 
 			# Set up callbacks
@@ -110,7 +142,8 @@ class HomeAssistantMQTT:
 			self.client.on_message = self.on_message
 			self.client.on_publish = self.on_publish
 			self.client.on_disconnect = self.on_disconnect
-			self.client.on_log = self.on_log  # Add logging callback
+			if debug:
+				self.client.on_log = self.on_log  # Add logging callback
 
 			if username and password:
 				logger.info(f"Configuring MQTT authentication with username: {username}")
@@ -122,6 +155,12 @@ class HomeAssistantMQTT:
 			self.base_topic = "homeassistant"
 			self.device_name = "timelapse_camera"
 			self.connected = False
+			# Called with True/False when capture is toggled from Home Assistant
+			self.on_capture_change = None
+
+			# Latest value of every state, published together as one JSON message
+			self.state = {}
+			self.state_lock = threading.Lock()
 
 			# Device info for Home Assistant
 			self.device_info = {
@@ -132,9 +171,20 @@ class HomeAssistantMQTT:
 				"sw_version": "1.0.0"
 			}
 
-			# Connect to MQTT broker
+			# Topics and discovery payloads are fixed, so build them once
+			self.status_topic = f"{self.device_name}/status"
+			self.image_topic = f"{self.device_name}/camera/image"
+			self.state_topic = f"{self.device_name}/state"
+			self.discovery_payloads = self.build_discovery_payloads()
+
+			# Set LWT (Last Will and Testament) for availability; it must be set before connecting
+			self.client.will_set(self.status_topic, "offline", qos=1, retain=True)
+
+			# Connect to MQTT broker in the background. The network loop keeps retrying
+			# with backoff, so capturing never waits on a broker that is down or restarting.
 			logger.info(f"Attempting to connect to MQTT broker at {host}:{port}...")
-			self.client.connect(host, port, 60)
+			self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+			self.client.connect_async(host, port, 60)
 			self.client.loop_start()
 			logger.info("MQTT network loop started")
 
@@ -146,6 +196,7 @@ class HomeAssistantMQTT:
 
 	def on_log(self, client, userdata, level, buf):
 		"""Callback for MQTT internal logging"""
+		import paho.mqtt.client as mqtt
 		level_map = {
 			mqtt.MQTT_LOG_INFO: logging.INFO,
 			mqtt.MQTT_LOG_NOTICE: logging.INFO,
@@ -170,6 +221,9 @@ class HomeAssistantMQTT:
 			logger.info(f"Connected to MQTT broker: {connection_responses.get(rc, 'Unknown response')}")
 			logger.info(f"Connection flags: {flags}")
 
+			# Send small publishes immediately instead of waiting on Nagle
+			self.set_tcp_nodelay()
+
 			# Subscribe to command topics
 			topic = f"{self.device_name}/command/#"
 			logger.info(f"Subscribing to topic: {topic}")
@@ -179,14 +233,22 @@ class HomeAssistantMQTT:
 			# Register entities with Home Assistant
 			logger.info("Registering entities with Home Assistant")
 			self.register_entities()
-
-			# Set LWT (Last Will and Testament) for availability
-			self.client.will_set(f"{self.device_name}/status", "offline", retain=True)
 		else:
 			self.connected = False
 			logger.error(f"Failed to connect to MQTT broker: {connection_responses.get(rc, 'Unknown error')}")
 			logger.error(f"Connection flags: {flags}")
 
+	def set_tcp_nodelay(self):
+		"""Disable Nagle's algorithm on the MQTT socket"""
+		try:
+			sock = self.client.socket()
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			nodelay = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+			logger.debug(f"TCP_NODELAY on MQTT socket: {nodelay}")
+		except Exception as e:
+			# Non-TCP transports (e.g. websockets) don't support this
+			logger.info(f"Could not set TCP_NODELAY on MQTT socket: {e}")
+
 	def on_disconnect(self, client, userdata, rc):
 		"""Callback when disconnected from MQTT broker"""
 		self.connected = False
@@ -209,82 +271,140 @@ class HomeAssistantMQTT:
 			if topic == f"{self.device_name}/command/capture":
 				if payload == "ON":
 					logger.info("Capture enabled via MQTT")
-					# TODO: Enable capture
 				else:
 					logger.info("Capture disabled via MQTT")
-					# TODO: Disable capture
+				if self.on_capture_change:
+					self.on_capture_change(payload == "ON")
 			elif topic == f"{self.device_name}/command/reboot":
 				logger.info("Reboot command received")
 				# TODO: Implement safe reboot
 		except Exception as e:
 			logger.error(f"Error processing MQTT message: {e}")
 
-	def register_entities(self):
-		"""Register entities with Home Assistant via MQTT discovery"""
-		logger.info("Starting entity registration with Home Assistant")
+	def build_discovery_payloads(self):
+		"""Build the Home Assistant discovery messages as (topic, payload) pairs
 
-		# Camera image
-		camera_config = {
+		The payloads never change while running, so they are JSON encoded once
+		here and reused whenever register_entities runs on (re)connect.
+		"""
+		# Latest image, sent as raw JPEG bytes (MQTT payloads are binary safe)
+		image_config = {
 			"name": "Timelapse Latest Photo",
 			"unique_id": f"{self.device_name}_latest_photo",
-			"topic": f"{self.device_name}/camera/image",
-			"encoding": "base64",
+			"image_topic": self.image_topic,
 			"content_type": "image/jpeg",
 			"device": self.device_info,
-			"availability_topic": f"{self.device_name}/status"
+			"availability_topic": self.status_topic
 		}
-		topic = f"{self.base_topic}/camera/{self.device_name}/config"
-		logger.info(f"Publishing camera configuration to {topic}")
-		self.client.publish(topic, json.dumps(camera_config), retain=True)
 
 		# Uptime sensor
 		uptime_config = {
 			"name": "Timelapse Uptime",
 			"unique_id": f"{self.device_name}_uptime",
-			"state_topic": f"{self.device_name}/state/uptime",
+			"state_topic": self.state_topic,
+			"value_template": "{{ value_json.uptime }}",
 			"device": self.device_info,
 			"unit_of_measurement": "minutes",
 			"device_class": "duration",
 			"state_class": "measurement",
-			"availability_topic": f"{self.device_name}/status"
+			"availability_topic": self.status_topic
 		}
-		topic = f"{self.base_topic}/sensor/{self.device_name}/uptime/config"
-		logger.info(f"Publishing uptime sensor configuration to {topic}")
-		self.client.publish(topic, json.dumps(uptime_config), retain=True)
 
 		# Last capture timestamp
 		timestamp_config = {
 			"name": "Last Photo Capture",
 			"unique_id": f"{self.device_name}_last_capture",
-			"state_topic": f"{self.device_name}/state/last_capture",
+			"state_topic": self.state_topic,
+			"value_template": "{{ value_json.last_capture | default(none) }}",
 			"device": self.device_info,
 			"device_class": "timestamp",
 			"entity_category": "diagnostic",
-			"availability_topic": f"{self.device_name}/status"
+			"availability_topic": self.status_topic
 		}
-		topic = f"{self.base_topic}/sensor/{self.device_name}/last_capture/config"
-		logger.info(f"Publishing timestamp sensor configuration to {topic}")
-		self.client.publish(topic, json.dumps(timestamp_config), retain=True)
 
-		# Publish initial online status
-		self.client.publish(f"{self.device_name}/status", "online", retain=True)
+		return [
+			# An empty retained config removes the base64 camera entity of older versions
+			(f"{self.base_topic}/camera/{self.device_name}/config", ""),
+			(f"{self.base_topic}/image/{self.device_name}/config", json_dumps(image_config)),
+			(f"{self.base_topic}/sensor/{self.device_name}/uptime/config", json_dumps(uptime_config)),
+			(f"{self.base_topic}/sensor/{self.device_name}/last_capture/config", json_dumps(timestamp_config))
+		]
 
-	def publish_state(self, entity_type, state):
-		"""Publish state updates to Home Assistant"""
-		if not self.connected:
-			logger.warning(f"Cannot publish state - MQTT not connected")
-			return
+	def register_entities(self):
+		"""Register entities with Home Assistant via MQTT discovery"""
+		logger.info("Starting entity registration with Home Assistant")
+
+		for topic, payload in self.discovery_payloads:
+			logger.debug(f"Publishing entity configuration to {topic}")
+			self.client.publish(topic, payload, qos=1, retain=True)
 
-		topic = f"{self.device_name}/state/{entity_type}"
-		logger.info(f"Publishing to {topic}: {state}")
-		result, mid = self.client.publish(topic, state, retain=True)
-		logger.info(f"Publish result: {result} (0=success) with message ID: {mid}")
+		# Publish initial online status
+		self.client.publish(self.status_topic, "online", qos=1, retain=True)
+
+	def publish_states(self, states, qos=0, retain=False):
+		"""Merge state updates and publish all states as one JSON message
+
+		Home Assistant picks the individual values out with value_template.
+		Frequent updates like the uptime heartbeat go out without retain; per-photo
+		updates are retained so e.g. the last capture time survives an HA restart.
+		Returns whether the message was handed to the client.
+		"""
+		# Publish under the lock too: the main loop and the photo worker both call this,
+		# and the broker must receive the snapshots in the order they were built
+		with self.state_lock:
+			self.state.update(states)
+			payload = json_dumps(self.state)
+
+			if not self.connected:
+				logger.warning(f"Cannot publish states - MQTT not connected")
+				return False
+
+			self.client.publish(self.state_topic, payload, qos=qos, retain=retain)
+		logger.debug(f"Published states: {payload}")
+		return True
 
 	def disconnect(self):
 		"""Disconnect from MQTT broker"""
 		self.client.loop_stop()
 		self.client.disconnect()
 
+# Frames judged unchanged are still saved or published at least this often
+UNCHANGED_REFRESH_SECONDS = 600
+
+def refresh_due(last_time):
+	"""Whether UNCHANGED_REFRESH_SECONDS have passed since last_time, a time.monotonic() value"""
+	return time.monotonic() - last_time >= UNCHANGED_REFRESH_SECONDS
+
+def sleep_until(deadline):
+	"""Sleep until a time.monotonic() deadline, to well within a millisecond
+
+	A plain sleep can overshoot by a few milliseconds, so sleep until shortly
+	before the deadline and spin for the rest.
+	"""
+	remaining = deadline - time.monotonic()
+	if remaining > 0.002:
+		time.sleep(remaining - 0.002)
+	while time.monotonic() < deadline:
+		pass
+
+def concat_entry(path):
+	"""Entry for one photo in an ffmpeg concat demuxer list, shown for one frame at 30fps"""
+	escaped = str(path).replace("'", "'\\''")
+	return f"file '{escaped}'\nduration {1 / 30:.6f}\n"
+
+def difference_hash(y_plane):
+	"""64-bit difference hash of a greyscale frame, used to spot unchanged scenes
+
+	The frame is averaged down to 9x8 blocks and each bit records whether
+	brightness increases from one block to the next along its row.
+	"""
+	height, width = y_plane.shape
+	blocks = y_plane[:height - height % 8, :width - width % 9].reshape(
+		8, height // 8, 9, width // 9
+	).mean(axis=(1, 3))
+	bits = (blocks[:, 1:] > blocks[:, :-1]).flatten()
+	return int("".join("1" if bit else "0" for bit in bits), 2)
+
 class TimelapseCamera:
 	def __init__(self, test_mode=False, skip_video=False):
 		self.config = load_config()
@@ -292,16 +412,53 @@ class TimelapseCamera:
 		logger.info(f"MQTT Settings - Host: {self.config['mqtt']['host']}, Port: {self.config['mqtt']['port']}")
 		logger.info(f"MQTT Auth - Username: {'configured' if self.config['mqtt']['username'] else 'not configured'}")
 
+		from picamera2 import Picamera2 # type: ignore
 		self.camera = Picamera2()
 		self.setup_camera()
 		self.base_dir = Path(self.config['paths']['base_dir'])
 		self.photos_dir = self.base_dir / self.config['paths']['photos_dir']
 		self.videos_dir = self.base_dir / self.config['paths']['videos_dir']
 		self.setup_directories()
+		# Photo paths are built by plain string concatenation on every capture
+		self.photo_prefix = str(self.photos_dir / "photo_")
+		self.last_photo_second = None
+		self.last_photo_stamp = None
+		self.photo_counter = 0
+		# Each day's index of saved photos, written by the worker
+		self.index_file = None
+		self.index_date = None
 		self.test_mode = test_mode
 		self.skip_video = skip_video
 		self.capturing_enabled = True
-		self.start_time = time.time()
+		# Set to wake the main loop early, e.g. when capture is toggled via MQTT
+		self.wake_event = threading.Event()
+		# Monotonic, so uptime doesn't jump when NTP steps the clock after boot
+		self.start_time = time.monotonic()
+		self.status_interval = self.config['mqtt'].get('status_interval_seconds', 30)
+		self.last_status_update = 0.0
+		self.last_status_capture = None
+		self.video_date = None
+		self.video_codec_args = None  # Chosen on first use by get_video_codec_args()
+		# Quality 85 encodes about 20% faster and gives ~20% smaller files than Picamera2's default 90
+		self.jpeg_quality = self.config['camera'].get('jpeg_quality', 85)
+		# Optionally skip saving frames that look the same as the last saved one (0 = off)
+		self.skip_unchanged_threshold = self.config['camera'].get('skip_unchanged_threshold', 0)
+		self.last_saved_luma = None
+		self.last_saved_time = 0.0
+		# Hash and time of the last preview sent to HA, to skip unchanged frames
+		self.last_thumbnail_hash = None
+		self.last_thumbnail_time = 0.0
+
+		# Location is fixed by the config; sun times are cached per day
+		self.tz = ZoneInfo(self.config['location']['timezone'])
+		from astral import LocationInfo # type: ignore
+		self.location = LocationInfo(
+			latitude=self.config['location']['latitude'],
+			longitude=self.config['location']['longitude'],
+			timezone=self.config['location']['timezone']
+		)
+		self.sun_times_date = None
+		self.sun_times = None
 
 		# Initialize MQTT connection
 		try:
@@ -310,25 +467,44 @@ class TimelapseCamera:
 				host=self.config['mqtt']['host'],
 				port=self.config['mqtt']['port'],
 				username=self.config['mqtt']['username'],
-				password=self.config['mqtt']['password']
+				password=self.config['mqtt']['password'],
+				debug=self.config['mqtt'].get('debug', False)
 			)
+			self.ha_mqtt.on_capture_change = self.set_capturing
 			logger.info("MQTT handler initialized successfully")
 		except Exception as e:
 			logger.error(f"Failed to initialize MQTT handler: {str(e)}")
 			logger.error("MQTT will be disabled")
 			self.ha_mqtt = None
 
+		# Saving and publishing photos runs on a worker thread, off the capture loop
+		self.photo_queue = queue.Queue(maxsize=4)
+		self.photo_worker = threading.Thread(target=self.process_photos, name="photo-worker", daemon=True)
+		self.photo_worker.start()
+
 	def setup_camera(self):
 		"""Initialize camera settings"""
 		try:
 			# Configure camera for 4K
+			width = self.config['camera']['resolution']['width']
+			height = self.config['camera']['resolution']['height']
 			camera_config = self.camera.create_still_configuration(
-				main={"size": (
-					self.config['camera']['resolution']['width'],
-					self.config['camera']['resolution']['height']
-				)},
-				controls={"FrameDurationLimits": (33333, 33333)}  # ~30fps
+				main={
+					"size": (width, height),
+					"format": "BGR888"  # RGB pixel order, as expected by PIL
+				},
+				# 1/8 size preview for Home Assistant, scaled by the ISP at no CPU cost
+				lores={
+					"size": (width // 16 * 2, height // 16 * 2),  # YUV420 needs even sizes
+					"format": "YUV420"
+				},
+				controls={"FrameDurationLimits": (33333, 33333)},  # ~30fps
+				# Hand out a frame that completes after each capture call rather than one that was
+				# already waiting, so the photo matches its scheduled time even on long exposures
+				buffer_count=1,
+				queue=False
 			)
+			self.camera.align_configuration(camera_config)
 			self.camera.configure(camera_config)
 			self.camera.start()
 			logger.info("Camera initialized successfully")
@@ -347,101 +523,314 @@ class TimelapseCamera:
 			raise
 
 	def get_sun_times(self):
-		"""Calculate sunrise and sunset times for the current day"""
+		"""Calculate sunrise and sunset times for the current day
+
+		The result only changes once a day, so it is cached per date.
+		"""
+		today = datetime.now(self.tz).date()
+		if self.sun_times_date == today:
+			return self.sun_times
+
 		try:
-			location = LocationInfo(
-				latitude=self.config['location']['latitude'],
-				longitude=self.config['location']['longitude'],
-				timezone=self.config['location']['timezone']
-			)
-			s = sun(location.observer, date=datetime.now())
+			from astral.sun import sun # type: ignore
+			s = sun(self.location.observer, date=today, tzinfo=self.tz)
 
 			start_time = s['sunrise'] - timedelta(hours=self.config['camera']['hours_before_sunrise'])
 			end_time = s['sunset'] + timedelta(hours=self.config['camera']['hours_after_sunset'])
 			logger.info(f"Today's recording from {start_time.strftime('%Y-%m-%d %H:%M:%S')} to {end_time.strftime('%Y-%m-%d %H:%M:%S')} ")
 
-			return start_time, end_time
+			self.sun_times_date = today
+			self.sun_times = (start_time, end_time)
+			return self.sun_times
 		except Exception as e:
 			logger.error(f"Failed to calculate sun times: {e}")
 			raise
 
 	def take_photo(self):
 		"""Capture a single photo with timestamp"""
+		from picamera2 import MappedArray # type: ignore
+		from PIL import Image
 		try:
-			timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-			filename = f"photo_{timestamp}.jpg"
-			filepath = self.photos_dir / filename
-
-			self.camera.capture_file(str(filepath))
-			logger.info(f"Photo captured: {filename}")
+			now = datetime.now()
+			# Only format the timestamp once per second; photos within the same second
+			# get a counter suffix instead of overwriting each other
+			second = now.replace(microsecond=0)
+			if second != self.last_photo_second:
+				self.last_photo_second = second
+				self.last_photo_stamp = self.photo_prefix + now.strftime('%Y%m%d_%H%M%S')
+				self.photo_counter = 0
+				filepath = self.last_photo_stamp + ".jpg"
+			else:
+				self.photo_counter += 1
+				filepath = f"{self.last_photo_stamp}_{self.photo_counter:02d}.jpg"
+
+			# Only grab the frame here; JPEG encoding and the SD card write happen on the worker.
+			# The image is unpacked straight from the mapped camera buffer, skipping the
+			# intermediate numpy copies make_array() and Image.fromarray() would make.
+			main_config = self.camera.camera_config["main"]
+			request = self.camera.capture_request()
+			try:
+				with MappedArray(request, "main", reshape=False, write=False) as mapped:
+					image = Image.frombuffer(
+						"RGB", main_config["size"], mapped.array, "raw", "RGB", main_config["stride"], 1
+					)
+				# The lores frame is tiny, so copy it for the worker to compare and encode after
+				# release. Not needed while the broker is unreachable, unless comparing frames.
+				if self.skip_unchanged_threshold or (self.ha_mqtt and self.ha_mqtt.client.is_connected()):
+					thumbnail = request.make_array("lores")
+				else:
+					thumbnail = None
+			finally:
+				request.release()
+			logger.debug(f"Photo captured: {filepath}")
 
-			# Publish to Home Assistant
-			if self.ha_mqtt:
-				try:
-					# Open and resize image
-					with Image.open(filepath) as img:
-						# Calculate new size (1/8 of original)
-						new_size = (img.width // 8, img.height // 8)
-						resized_img = img.resize(new_size, Image.Resampling.LANCZOS)
-
-						# Convert to JPEG bytes
-						img_byte_arr = io.BytesIO()
-						resized_img.save(img_byte_arr, format='JPEG', quality=70)
-						img_byte_arr = img_byte_arr.getvalue()
-
-						# Convert to base64
-						img_base64 = base64.b64encode(img_byte_arr).decode('utf-8')
-						img_size_kb = len(img_byte_arr) / 1024
-
-						# Log size information
-						logger.info(f"Image size before base64: {img_size_kb:.1f}KB")
-						logger.info(f"Image dimensions after resize: {new_size[0]}x{new_size[1]}")
-
-						# Publish to MQTT
-						topic = f"{self.ha_mqtt.device_name}/camera/image"
-						logger.info(f"Publishing resized image ({len(img_base64)} bytes) to {topic}")
-						self.ha_mqtt.client.publish(topic, img_base64, retain=True)
-
-						# Publish timestamp in ISO format with timezone
-						now = datetime.now().astimezone().isoformat()
-						self.ha_mqtt.publish_state("last_capture", now)
-
-						# Also publish the path for reference
-						self.ha_mqtt.publish_state("latest_photo", str(filepath))
-				except Exception as e:
-					logger.error(f"Failed to publish image: {e}")
+			# Never block the capture schedule on a stalled SD card; drop the photo instead
+			try:
+				self.photo_queue.put_nowait((image, thumbnail, filepath, now.astimezone().isoformat()))
+			except queue.Full:
+				logger.warning(f"Photo queue full, dropping {filepath}")
 		except Exception as e:
 			logger.error(f"Failed to capture photo: {e}")
 
+	def process_photos(self):
+		"""Worker thread saving and publishing captured photos until a None sentinel is queued"""
+		while True:
+			item = self.photo_queue.get()
+			if item is None:
+				break
+			image, thumbnail, filepath, captured_at = item
+			# An error with one photo must never stop the worker, or capturing stalls
+			try:
+				unchanged, luma = False, None
+				if self.skip_unchanged_threshold:
+					unchanged, luma = self.is_unchanged(thumbnail)
+				if unchanged:
+					logger.debug(f"Scene unchanged, not saving {filepath}")
+				elif self.save_photo(image, filepath):
+					# Only a photo that's actually on disk becomes the reference for the next ones
+					if luma is not None:
+						self.last_saved_luma = luma
+						self.last_saved_time = time.monotonic()
+					self.add_to_index(filepath)
+					if thumbnail is not None and self.ha_mqtt and self.ha_mqtt.client.is_connected():
+						self.publish_photo(thumbnail, filepath, captured_at)
+			except Exception as e:
+				logger.error(f"Failed to process photo {filepath}: {e}")
+			finally:
+				self.photo_queue.task_done()
+
+	def is_unchanged(self, thumbnail):
+		"""Check whether a frame barely differs from the last saved one
+
+		Compares the mean brightness difference of a ~64 pixel wide version of the
+		lores luma plane. Returns whether the frame is unchanged, and that luma to
+		keep as the reference once the photo has been saved.
+		"""
+		width, height = self.camera.camera_config["lores"]["size"]
+		factor = max(width // 64, 1)
+		rows, cols = height // factor, width // factor
+		luma = thumbnail[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor).mean(axis=(1, 3))
+
+		unchanged = (self.last_saved_luma is not None
+				and abs(luma - self.last_saved_luma).mean() < self.skip_unchanged_threshold
+				and not refresh_due(self.last_saved_time))
+		return unchanged, luma
+
+	def add_to_index(self, filepath):
+		"""Append a saved photo to its day's index, the ffmpeg concat list create_video uses"""
+		try:
+			# The date is part of the filename, right after the prefix
+			date = filepath[len(self.photo_prefix):len(self.photo_prefix) + 8]
+			if date != self.index_date:
+				if self.index_file:
+					self.index_file.close()
+				# Line buffered, so the index is complete on disk after every photo
+				self.index_file = open(self.photos_dir / f"index_{date}.txt", 'a', buffering=1)
+				self.index_date = date
+			self.index_file.write(concat_entry(filepath))
+		except Exception as e:
+			logger.error(f"Failed to add photo to index: {e}")
+
+	def save_photo(self, image, filepath):
+		"""Encode a captured frame as JPEG and write it to disk"""
+		try:
+			with open(filepath, 'wb') as f:
+				image.save(f, format='JPEG', quality=self.jpeg_quality)
+			logger.info(f"Photo saved: {filepath}")
+			return True
+		except Exception as e:
+			logger.error(f"Failed to save photo: {e}")
+			return False
+
+	def publish_photo(self, thumbnail, filepath, captured_at):
+		"""Publish the lores preview of a photo and its capture time to Home Assistant"""
+		try:
+			width, height = self.camera.camera_config["lores"]["size"]
+
+			# Skip encoding and sending near-identical frames (e.g. at night), but still
+			# refresh the image now and then so HA never shows a stale picture for long
+			image_hash = difference_hash(thumbnail[:height, :width])
+			if (self.last_thumbnail_hash is not None
+					and bin(image_hash ^ self.last_thumbnail_hash).count('1') <= 6
+					and not refresh_due(self.last_thumbnail_time)):
+				logger.debug("Preview unchanged, not publishing image")
+			else:
+				self.publish_thumbnail(thumbnail, width, height)
+				self.last_thumbnail_hash = image_hash
+				self.last_thumbnail_time = time.monotonic()
+
+			# Publish timestamp in ISO format with timezone, and the path for reference
+			self.ha_mqtt.publish_states({"last_capture": captured_at, "latest_photo": filepath}, retain=True)
+		except Exception as e:
+			logger.error(f"Failed to publish image: {e}")
+
+	def publish_thumbnail(self, thumbnail, width, height):
+		"""Encode the lores YUV420 frame as JPEG and publish it to the image topic"""
+		import simplejpeg # type: ignore
+		# Encode the YUV420 planes directly, with no resize or RGB conversion.
+		# The U and V planes follow the Y plane at half its stride, so viewing the
+		# buffer as half-stride rows lets all three be sliced out without copying.
+		chroma_rows = thumbnail.reshape((thumbnail.shape[0] * 2, thumbnail.strides[0] // 2))
+		y_plane = thumbnail[:height, :width]
+		u_plane = chroma_rows[2 * height:2 * height + height // 2, :width // 2]
+		v_plane = chroma_rows[2 * height + height // 2:, :width // 2]
+		jpeg_bytes = simplejpeg.encode_jpeg_yuv_planes(y_plane, u_plane, v_plane, quality=70)
+
+		# Publish to MQTT
+		topic = self.ha_mqtt.image_topic
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug(f"Image size: {len(jpeg_bytes) / 1024:.1f}KB")
+			logger.debug(f"Image dimensions: {width}x{height}")
+			logger.debug(f"Publishing resized image to {topic}")
+		# A fresh frame follows within one interval, so the image isn't worth retaining
+		self.ha_mqtt.client.publish(topic, jpeg_bytes, qos=0, retain=False)
+
+	def get_video_codec_args(self):
+		"""Pick the ffmpeg encoder arguments, preferring the Pi's hardware H.264 encoder
+
+		ffmpeg is only probed once; the result is reused for every video.
+		"""
+		if self.video_codec_args is None:
+			# -c:v h264_v4l2m2m: Encode on the Pi's hardware H.264 block instead of the CPU
+			# -num_output_buffers 4: Queue 4 raw frames for the encoder instead of 16 (saves ~36MB CMA at 1080p)
+			# The coded (capture) buffers stay at ffmpeg's default of 4, which is also its minimum
+			hardware_args = ["-c:v", "h264_v4l2m2m", "-num_output_buffers", "4"]
+
+			# Many ffmpeg builds list h264_v4l2m2m even without the hardware (desktops, Pi 5),
+			# so check that the encoder really opens by encoding a single test frame
+			try:
+				result = subprocess.run(
+					[
+						"ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+						"-f", "lavfi", "-i", "color=s=64x64", "-frames:v", "1",
+						*hardware_args, "-pix_fmt", "yuv420p", "-f", "null", "-"
+					],
+					stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30
+				)
+				has_v4l2m2m = result.returncode == 0
+			except (OSError, subprocess.TimeoutExpired) as e:
+				logger.error(f"Failed to probe the hardware video encoder: {e}")
+				has_v4l2m2m = False
+
+			if has_v4l2m2m:
+				self.video_codec_args = hardware_args
+			else:
+				# No hardware encoder (e.g. on a dev machine), use a fast software preset on all cores
+				self.video_codec_args = ["-c:v", "libx264", "-preset", "veryfast", "-threads", "0"]
+			logger.info(f"Using video encoder {self.video_codec_args[1]}")
+		return self.video_codec_args
+
 	def create_video(self):
 		"""Create video from photos taken today"""
-		try:
-			# Video creation temporarily disabled for stability testing
-			logger.info("Video creation temporarily disabled for stability testing")
+		if not self.config.get('video', {}).get('enabled', False):
+			logger.info("Video creation disabled in config")
 			return
 
-			# today = datetime.now().strftime('%Y%m%d')
-			# output_file = self.videos_dir / f"timelapse_{today}.mp4"
-			#
-			# # Use ffmpeg to create video from photos
-			# # -y: Override output file if it exists
-			# # -b:v 8M: Set video bitrate to 8 Mbps
-			# os.system(f"ffmpeg -y -framerate 30 -pattern_type glob -i '{self.photos_dir}/photo_{today}_*.jpg' "
-			#          f"-c:v libx264 -pix_fmt yuv420p -b:v 8M {output_file}")
-			#
-			# logger.info(f"Video created: {output_file}")
+		try:
+			# Make sure the worker has written every queued photo; join() would never
+			# return if the worker thread had died
+			if self.photo_worker.is_alive():
+				self.photo_queue.join()
+			else:
+				logger.error("Photo worker is not running, creating video from the photos saved so far")
+
+			today = datetime.now().strftime('%Y%m%d')
+			output_file = self.videos_dir / f"timelapse_{today}.mp4"
+
+			# Hand ffmpeg an explicit file list (concat demuxer) so it reads the photos
+			# itself, without a shell glob or a directory scan.
+			# The worker keeps that list for each day as it saves photos.
+			list_file = self.photos_dir / f"index_{today}.txt"
+			temporary_list = not list_file.exists()
+			if temporary_list:
+				# No index for today (e.g. photos from before it existed), so scan the directory
+				photos = sorted(self.photos_dir.glob(f"photo_{today}_*.jpg"))
+				if not photos:
+					logger.info("No photos taken today, skipping video creation")
+					return
+				list_file = self.videos_dir / f"timelapse_{today}.txt"
+				with open(list_file, 'w') as f:
+					f.writelines(concat_entry(photo) for photo in photos)
+
+			# -y: Override output file if it exists
+			# -loglevel error: Only report problems, each streamed into our log as it arrives
+			# -b:v 8M: Set video bitrate to 8 Mbps
+			command = [
+				"ffmpeg", "-y", "-nostdin", "-hide_banner", "-loglevel", "error",
+				"-f", "concat", "-safe", "0", "-i", str(list_file),
+				*self.get_video_codec_args(),
+				"-r", "30", "-pix_fmt", "yuv420p", "-b:v", "8M",
+				str(output_file)
+			]
+			logger.info(f"Creating video from {list_file}")
+			try:
+				# Log ffmpeg's messages as they arrive rather than holding them all until it exits
+				with subprocess.Popen(command, stderr=subprocess.PIPE, bufsize=1024 * 1024) as process:
+					for line in process.stderr:
+						logger.warning(f"ffmpeg: {line.decode(errors='replace').rstrip()}")
+			finally:
+				if temporary_list:
+					list_file.unlink()
+
+			if process.returncode != 0:
+				logger.error(f"ffmpeg exited with code {process.returncode}")
+				return
+			logger.info(f"Video created: {output_file}")
 		except Exception as e:
 			logger.error(f"Failed to create video: {e}")
 
 	def update_ha_status(self):
-		"""Update Home Assistant with current status"""
-		if self.ha_mqtt:
-			# Update uptime (convert to minutes)
-			uptime_minutes = int((time.time() - self.start_time) / 60)
-			self.ha_mqtt.publish_state("uptime", str(uptime_minutes))
+		"""Update Home Assistant with current status
 
-			# Update capture state
-			self.ha_mqtt.publish_state("capture", "ON" if self.capturing_enabled else "OFF")
+		Rate limited to one update per status interval, except when the capture state changed.
+		"""
+		if self.ha_mqtt:
+			now = time.monotonic()
+			capture = "ON" if self.capturing_enabled else "OFF"
+			if capture == self.last_status_capture and now - self.last_status_update < self.status_interval:
+				return
+
+			# Update uptime (convert to minutes) and capture state together
+			uptime_minutes = int((now - self.start_time) / 60)
+			if self.ha_mqtt.publish_states({"uptime": uptime_minutes, "capture": capture}):
+				self.last_status_update = now
+				self.last_status_capture = capture
+
+	def stop_camera(self):
+		"""Stop the camera outside the capture window, so the sensor isn't powered for nothing"""
+		if self.camera.started:
+			logger.info("Stopping camera until the next capture window")
+			self.camera.stop()
+
+	def set_capturing(self, enabled):
+		"""Enable or disable capturing and wake the main loop to act on it"""
+		self.capturing_enabled = enabled
+		self.wake_event.set()
+
+	def wait(self, seconds):
+		"""Sleep for up to seconds, returning early if the main loop is woken"""
+		self.wake_event.wait(timeout=max(seconds, 0))
+		self.wake_event.clear()
 
 	def run(self):
 		"""Main loop for the timelapse system"""
@@ -456,23 +845,27 @@ class TimelapseCamera:
 			logger.info("Running in test mode")
 			self.update_ha_status()  # Initial status update
 
-			for i in range(self.config['camera']['test_capture_count']):
+			capture_count = self.config['test_mode']['capture_count']
+			interval = self.config['test_mode']['interval_seconds']
+			next_capture = time.monotonic()
+			for i in range(capture_count):
 				if not self.capturing_enabled:
 					logger.info("Capture disabled, skipping test photos")
 					break
 
-				logger.info(f"Taking test photo {i+1}/{self.config['camera']['test_capture_count']}")
+				logger.info(f"Taking test photo {i+1}/{capture_count}")
 				self.take_photo()
 				self.update_ha_status()
-				time.sleep(self.config['camera']['test_interval_seconds'])
 
-			# Video creation temporarily disabled for stability testing
-			logger.info("Video creation temporarily disabled for stability testing")
-			# if not self.skip_video:
-			#     logger.info("Creating test video")
-			#     self.create_video()
-			# else:
-			#     logger.info("Skipping video creation (--no-video flag set)")
+				# Keep to a fixed schedule so capture time doesn't add up to drift
+				next_capture += interval
+				sleep_until(next_capture)
+
+			if not self.skip_video:
+				logger.info("Creating test video")
+				self.create_video()
+			else:
+				logger.info("Skipping video creation (--no-video flag set)")
 
 			logger.info("Test completed")
 
@@ -481,6 +874,10 @@ class TimelapseCamera:
 
 	def _run_normal_mode(self):
 		"""Original production mode"""
+		interval = self.config['camera']['interval_minutes'] * 60
+		next_capture = None  # Monotonic deadline of the next photo while capturing
+		# Idle waits run to the next real event; this only bounds them so HA's uptime stays fresh
+		max_idle_wait = 300
 		while True:
 			try:
 				self.update_ha_status()  # Update Home Assistant status
@@ -489,11 +886,35 @@ class TimelapseCamera:
 				current_time = datetime.now(start_time.tzinfo)
 
 				if start_time <= current_time <= end_time and self.capturing_enabled:
-					self.take_photo()
-					time.sleep(self.config['camera']['interval_minutes'] * 60)
+					if not self.camera.started:
+						logger.info("Starting camera for today's capture window")
+						self.camera.start()
+						time.sleep(1)  # Let auto exposure and white balance settle
+
+					# Only shoot once the deadline is due, the wait below may end early
+					now = time.monotonic()
+					if next_capture is None or now >= next_capture:
+						if next_capture is None:
+							next_capture = now
+						self.take_photo()
+
+						# Sleep until the next deadline so time spent capturing doesn't add drift.
+						# If we fell behind, shoot right away rather than bursting to catch up.
+						next_capture += interval
+						now = time.monotonic()
+						if next_capture < now:
+							next_capture = now
+					self.wait(next_capture - now)
 				elif current_time > end_time:
-					# Video creation temporarily disabled for stability testing
-					logger.info("Video creation temporarily disabled for stability testing")
+					next_capture = None
+					self.stop_camera()
+
+					# Create today's video once the capture window has closed
+					today = datetime.now().date()
+					if self.video_date != today:
+						self.create_video()
+						self.video_date = today
+
 					# Wait until next day
 					tomorrow = current_time + timedelta(days=1)
 					tomorrow_start = tomorrow.replace(
@@ -502,27 +923,37 @@ class TimelapseCamera:
 						second=0,
 						microsecond=0
 					)
-					sleep_seconds = min((tomorrow_start - current_time).total_seconds(), 60)
-					logger.info(f"Waiting {sleep_seconds/3600:.1f} hours until next day")
-					time.sleep(sleep_seconds)
-					self.update_ha_status()  # Update status after long sleep
+					sleep_seconds = min((tomorrow_start - current_time).total_seconds(), max_idle_wait)
+					logger.debug(f"Waiting {sleep_seconds/3600:.1f} hours until next day")
+					self.wait(sleep_seconds)
 				else:
-					# Wait until start time or until capturing is enabled
-					sleep_seconds = min(
-						(start_time - current_time).total_seconds(),
-						60  # Check status every minute
-					)
-					logger.info(f"Waiting {sleep_seconds/3600:.1f} hours until start time")
-					time.sleep(sleep_seconds)
-					self.update_ha_status()  # Update status after sleep
+					next_capture = None
+
+					# Wait until start time, or until capturing is enabled if we're already past it
+					if current_time < start_time:
+						self.stop_camera()
+						sleep_seconds = min((start_time - current_time).total_seconds(), max_idle_wait)
+					else:
+						sleep_seconds = max_idle_wait
+					logger.debug(f"Waiting {sleep_seconds/3600:.1f} hours until start time")
+					self.wait(sleep_seconds)
 
 			except Exception as e:
 				logger.error(f"Error in main loop: {e}")
-				time.sleep(60)  # Wait a minute before retrying
+				self.wait(60)  # Wait a minute before retrying
 
 	def cleanup(self):
 		"""Cleanup resources before exit"""
 		try:
+			# Let the worker save and publish queued photos before shutting down
+			if self.photo_worker.is_alive():
+				try:
+					self.photo_queue.put(None, timeout=30)
+					self.photo_worker.join(timeout=30)
+				except queue.Full:
+					logger.error("Photo worker is stuck, not waiting for queued photos")
+			if self.index_file:
+				self.index_file.close()
 			if self.camera:
 				self.camera.stop()
 			if self.ha_mqtt:
@@ -536,8 +967,19 @@ if __name__ == "__main__":
 	parser.add_argument('--no-video', action='store_true', help='Skip video creation in test mode')
 	args = parser.parse_args()
 
-	camera = TimelapseCamera(test_mode=args.test, skip_video=args.no_video)
+	log_listener = setup_logging(load_config())
+
+	def handle_sigterm(signum, frame):
+		"""Exit normally on SIGTERM (e.g. systemctl stop) so the cleanup below runs"""
+		raise SystemExit(0)
+	signal.signal(signal.SIGTERM, handle_sigterm)
+
 	try:
-		camera.run()
+		camera = TimelapseCamera(test_mode=args.test, skip_video=args.no_video)
+		try:
+			camera.run()
+		finally:
+			camera.cleanup()
 	finally:
-		camera.cleanup()
\ No newline at end of file
+		log_listener.stop()  # Hands any queued log records to the handlers
+		logging.shutdown()  # Writes out records still buffered by the MemoryHandler
\ No newline at end of file